@@ -82,6 +82,10 @@ extras = {
 
 basedir = '../web-languages'
 
+# optional output of host_languages.py; suggest the top hosts for each language
+host_languages_file = 'host_languages.tsv'
+max_candidate_sites = 10
+
 
 def add_names(entry, names):
     Names = [entry['Ref_Name']] + entry.get('Extra_Names', [])
@@ -114,6 +118,16 @@ def main():
     wikipedia_languages_table = read_tsv_pa('wikipedia_languages_all.tsv', column_names=column_names, usecols=usecols)
     print('wikipedia_language rows', wikipedia_languages_table.num_rows)
 
+    host_languages_table = None
+    if os.path.exists(host_languages_file):
+        column_names = ['host', 'Id', 'count', 'fraction']
+        usecols = ['host', 'Id', 'count']
+        host_languages_table = read_tsv_pa(host_languages_file, column_names=column_names, usecols=usecols)
+        # don't trust the file order, the top hosts are picked below
+        host_languages_table = host_languages_table.sort_by([('Id', 'ascending'), ('count', 'descending'),
+                                                            ('host', 'ascending')])
+        print('host_languages rows', host_languages_table.num_rows)
+
     # these are small so let's do it in python
     table_dicts = table.to_pylist()  # list of dictionaries
     mOSCAR_dicts = mOSCAR_table.to_pylist()
@@ -185,6 +199,22 @@ def main():
         if names:
             add_names(entry, names)
 
+    # host_languages host Id count -- sorted above by Id, then by count descending
+    if host_languages_table is not None:
+        missing = set()
+        for d in host_languages_table.to_pylist():
+            Id = d['Id']
+            if Id not in ids:
+                missing.add(Id)
+                continue
+            entry = ids[Id]
+            if 'candidate_sites' not in entry:
+                entry['candidate_sites'] = []
+            if len(entry['candidate_sites']) < max_candidate_sites:
+                entry['candidate_sites'].append(d['host'])
+        for Id in sorted(missing):
+            print(f'warning: host_languages Id {Id} not in table, skipping')
+
     # add in extras
     for Id, d in extras.items():
         if Id not in ids:
@@ -0,0 +1,206 @@
+"""
+Build a host to language index from Common Crawl columnar URL index samples
+
+Reads local Parquet files shaped like the Common Crawl columnar URL index
+(https://commoncrawl.org/columnar-index) and aggregates, per registered
+domain, how many captures were detected in each language. The result is
+a compact TSV (host, ISO-639-3 Id, count, fraction) which generate.py
+joins in to suggest candidate sites on each language page. The fraction
+is the share of the host's captures which list the language, so a site
+whose pages are all `cym,eng` gets 1.0 for both Welsh and English.
+
+Only the columns url_host_registered_domain and content_languages are
+read. The data is streamed in record batches and aggregated with Arrow's
+group-by. Partial aggregates are folded into the running total once they
+hold as many rows as the total itself (and at least --compact-rows), so
+every pair is re-aggregated only a logarithmic number of times. Peak
+memory is about 3 to 4 times the final number of distinct (host, language)
+pairs (total, pending partials of the same size, and the group-by output
+during a fold), independent of the number of input rows.
+
+Call with command-line flags -h or --help for additional options.
+"""
+
+import argparse
+import logging
+import sys
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.dataset as ds
+
+
+LOGGING_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+LOG_LEVEL = 'INFO'
+logging.basicConfig(level=LOG_LEVEL, format=LOGGING_FORMAT)
+
+HOST_COLUMN = 'url_host_registered_domain'
+LANGUAGES_COLUMN = 'content_languages'
+# read as `string` even if the files were written with `large_string`,
+# so that partial aggregates from all files concatenate
+INPUT_SCHEMA = pa.schema([(HOST_COLUMN, pa.string()), (LANGUAGES_COLUMN, pa.string())])
+
+PAIR_KEYS = ['host', 'Id']
+HOST_KEYS = ['host']
+
+
+def batch_counts(batch):
+    """Count captures per (host, language) and per host in one record batch.
+    content_languages is a comma-separated list of up to 3 ISO-639-3
+    codes; every listed language is counted once for the capture, the
+    capture itself is counted once for the host.
+
+    >>> batch = pa.record_batch({HOST_COLUMN: ['a.fr', 'a.fr', 'b.is'],
+    ...                          LANGUAGES_COLUMN: ['fra,eng', 'fra', 'isl,eng']})
+    >>> counts, host_counts = batch_counts(batch)
+    >>> counts.sort_by([('host', 'ascending'), ('Id', 'ascending')]).to_pydict()
+    {'host': ['a.fr', 'a.fr', 'b.is', 'b.is'], 'Id': ['eng', 'fra', 'eng', 'isl'], 'count': [1, 2, 1, 1]}
+    >>> host_counts.sort_by('host').to_pydict()
+    {'host': ['a.fr', 'b.is'], 'count': [2, 1]}
+
+    `large_string` columns give `string` aggregates, which merge with the others:
+
+    >>> large = pa.record_batch({HOST_COLUMN: pa.array(['a.fr'], pa.large_string()),
+    ...                          LANGUAGES_COLUMN: pa.array(['fra'], pa.large_string())})
+    >>> large_counts, large_host_counts = batch_counts(large)
+    >>> merged = merge_counts([counts, large_counts], PAIR_KEYS)
+    >>> merged.sort_by([('host', 'ascending'), ('Id', 'ascending')]).to_pydict()
+    {'host': ['a.fr', 'a.fr', 'b.is', 'b.is'], 'Id': ['eng', 'fra', 'eng', 'isl'], 'count': [1, 3, 1, 1]}
+    >>> merge_counts([host_counts, large_host_counts], HOST_KEYS).sort_by('host').to_pydict()
+    {'host': ['a.fr', 'b.is'], 'count': [3, 1]}
+    """
+    host = pc.cast(batch.column(HOST_COLUMN), pa.string())
+    languages = pc.split_pattern(pc.cast(batch.column(LANGUAGES_COLUMN), pa.string()), ',')
+    # one row per (capture, language): repeat the host for each language
+    hosts = pc.take(host, pc.list_parent_indices(languages))
+    pairs = pa.table({'host': hosts, 'Id': pc.list_flatten(languages)})
+    pairs = pairs.filter(pc.not_equal(pairs['Id'], ''))
+    counts = pairs.group_by(['host', 'Id']).aggregate([('Id', 'count')]).rename_columns(['host', 'Id', 'count'])
+    # the unsplit batch, so that a multi-language capture counts once
+    captures = pa.table({'host': host})
+    host_counts = captures.group_by('host').aggregate([('host', 'count')]).rename_columns(['host', 'count'])
+    return counts, host_counts
+
+
+def merge_counts(tables, keys):
+    """Combine partial aggregates with a count column into one
+
+    >>> a = pa.table({'host': ['a.fr', 'b.is'], 'count': [2, 1]})
+    >>> b = pa.table({'host': ['a.fr'], 'count': [3]})
+    >>> merge_counts([a, b], ['host']).sort_by('host').to_pydict()
+    {'host': ['a.fr', 'b.is'], 'count': [5, 1]}
+    """
+    table = pa.concat_tables(tables)
+    return table.group_by(keys).aggregate([('count', 'sum')]).rename_columns(keys + ['count'])
+
+
+def aggregate(paths, batch_size, compact_rows):
+    """Stream the Parquet files and return the (host, Id, count)
+    and (host, count) tables"""
+    # a directory can't be mixed with files in one source list, so wrap each path
+    dataset = ds.dataset([ds.dataset(path, schema=INPUT_SCHEMA, format='parquet') for path in paths])
+    batches = dataset.to_batches(
+        columns=[HOST_COLUMN, LANGUAGES_COLUMN],
+        filter=pc.field(HOST_COLUMN).is_valid() & pc.field(LANGUAGES_COLUMN).is_valid(),
+        batch_size=batch_size,
+    )
+
+    schema = pa.schema([('host', pa.string()), ('Id', pa.string()), ('count', pa.int64())])
+    total = schema.empty_table()
+    host_total = schema.remove(1).empty_table()
+    pending = []
+    host_pending = []
+    pending_rows = 0
+    rows = 0
+    for batch in batches:
+        if not batch.num_rows:
+            continue
+        rows += batch.num_rows
+        counts, host_counts = batch_counts(batch)
+        pending.append(counts)
+        host_pending.append(host_counts)
+        pending_rows += counts.num_rows
+        # fold geometrically: only when the partials are as big as the
+        # running total, so re-aggregating the total stays linear overall
+        if pending_rows >= max(compact_rows, total.num_rows):
+            total = merge_counts([total] + pending, PAIR_KEYS)
+            host_total = merge_counts([host_total] + host_pending, HOST_KEYS)
+            pending = []
+            host_pending = []
+            pending_rows = 0
+            logging.info('%d rows read, %d distinct host/language pairs', rows, total.num_rows)
+
+    if pending:
+        total = merge_counts([total] + pending, PAIR_KEYS)
+        host_total = merge_counts([host_total] + host_pending, HOST_KEYS)
+    logging.info('%d rows read, %d distinct host/language pairs', rows, total.num_rows)
+    return total, host_total
+
+
+def host_index(counts, host_counts, min_count, min_fraction):
+    """Add the fraction of the host's captures listing the language and
+    keep only the pairs which are frequent enough to suggest the host
+    for the language
+
+    >>> batch = pa.record_batch({HOST_COLUMN: ['a.fr', 'a.fr', 'b.is', 'b.is', 'b.is'],
+    ...                          LANGUAGES_COLUMN: ['fra,eng', 'fra', 'isl,eng', 'isl,eng', 'eng']})
+    >>> host_index(*batch_counts(batch), min_count=2, min_fraction=0.5).to_pydict()
+    {'host': ['b.is', 'a.fr', 'b.is'], 'Id': ['eng', 'fra', 'isl'], 'count': [3, 2, 2], 'fraction': [1.0, 1.0, 0.6667]}
+    """
+    host_counts = host_counts.rename_columns(['host', 'host_count'])
+    table = counts.join(host_counts, 'host')
+    fraction = pc.divide(pc.cast(table['count'], pa.float64()), pc.cast(table['host_count'], pa.float64()))
+    table = table.append_column('fraction', pc.round(fraction, 4)).drop_columns(['host_count'])
+    table = table.filter(pc.and_(
+        pc.greater_equal(table['count'], min_count),
+        pc.greater_equal(table['fraction'], min_fraction),
+    ))
+    return table.sort_by([('Id', 'ascending'), ('count', 'descending'), ('host', 'ascending')])
+
+
+def write_tsv(table, fname):
+    columns = ['host', 'Id', 'count', 'fraction']
+    write_options = csv.WriteOptions(include_header=False, delimiter='\t', quoting_style='none')
+    with pa.OSFile(fname, 'wb') as f:
+        # commented header, like the other TSVs read by generate.py
+        f.write(('#' + '\t'.join(columns) + '\n').encode('utf-8'))
+        csv.write_csv(table.select(columns), f, write_options=write_options)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument(
+        'paths', nargs='+',
+        help='Parquet files or directories with columns '
+        f'{HOST_COLUMN} and {LANGUAGES_COLUMN}')
+    arg_parser.add_argument(
+        '--output', type=str, default='host_languages.tsv',
+        help='output TSV file (default: %(default)s)')
+    arg_parser.add_argument(
+        '--batch-size', type=int, default=1 << 20,
+        help='rows per record batch read from Parquet (default: %(default)s)')
+    arg_parser.add_argument(
+        '--compact-rows', type=int, default=5_000_000,
+        help='fold partial aggregates into the running total once they '
+        'hold this many rows, or as many rows as the total if that is '
+        'bigger (default: %(default)s)')
+    arg_parser.add_argument(
+        '--min-count', type=int, default=10,
+        help='minimum number of captures of a host in a language (default: %(default)s)')
+    arg_parser.add_argument(
+        '--min-fraction', type=float, default=0.5,
+        help='minimum fraction of a host\'s captures listing the language; a capture '
+        'may list several languages (default: %(default)s)')
+    args = arg_parser.parse_args(sys.argv[1:])
+
+    logging.info('Command-line arguments: %s', args)
+    counts, host_counts = aggregate(args.paths, args.batch_size, args.compact_rows)
+    table = host_index(counts, host_counts, args.min_count, args.min_fraction)
+    logging.info('Writing %d host/language pairs for %d languages to %s',
+                 table.num_rows, len(pc.unique(table['Id'])), args.output)
+    write_tsv(table, args.output)
+
+
+if __name__ == '__main__':
+    main()